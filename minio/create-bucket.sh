@@ -32,6 +32,18 @@ done
 if [ -d /data/datasource ]; then
   echo "Copying local datasource to bucket datasource..."
   mc cp --recursive /data/datasource ${MC_ALIAS}/datasource || true
+
+  # Pack each class into a single tar shard so training can pull it with
+  # a few ranged GETs instead of one request per image. The member count is
+  # stored as object metadata so the loader can size its arrays up front.
+  for CLASS in Normal Pneumonia; do
+    if [ -d /data/datasource/${CLASS} ] && command -v tar >/dev/null 2>&1; then
+      echo "Packing shard ${CLASS}.tar..."
+      COUNT=$(find /data/datasource/${CLASS} -type f | wc -l | tr -d ' ')
+      tar -cf /tmp/${CLASS}.tar -C /data/datasource/${CLASS} . \
+        && mc cp --attr "count=${COUNT}" /tmp/${CLASS}.tar ${MC_ALIAS}/datasource/${CLASS}.tar || true
+    fi
+  done
 fi
 
 echo "Bucket creation script finished."
@@ -1,28 +1,89 @@
 import os
-import subprocess
 import pickle
 from datetime import datetime
 import logging
-import boto3
-import watermark
+from importlib import metadata
+import numpy as np
+from joblib import parallel_backend
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.model_selection import train_test_split
-from utils.bucket_utils import wait_for_bucket
+from utils.bucket_utils import LATEST_MODEL_KEY, meta_key_for, wait_for_bucket
 from utils.config_reader import load_config
+from utils.s3_client import get_s3
 from utils.data_utils import load_data
+from utils.serialization_utils import upload_model
 from dotenv import load_dotenv
 
 #Load  .env and AWs credentials
 load_dotenv()
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-MLFLOW_S3_ENDPOINT_URL = os.getenv("MLFLOW_S3_ENDPOINT_URL")
 
 #configurando logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('model-init')
 
+def _package_version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "not installed"
+
+# Versões dos pacotes, lidas uma única vez na importação do módulo
+VERSION_INFO = {
+    package: _package_version(package)
+    for package in ("numpy", "scipy", "pandas", "scikit-learn", "opencv-python", "boto3")
+}
+
+# Limites de memória aplicados quando ausentes do config.yaml. Sem max_depth /
+# max_samples a memória de cada árvore cresce com o número de amostras.
+RF_MEMORY_DEFAULTS = {
+    'max_depth': 20,
+    'max_samples': 0.5,
+    'n_jobs': -1,
+    'max_features': 'sqrt',
+}
+
+# Variáveis de ambiente que sobrescrevem o config (ex.: CI com pouca memória)
+RF_ENV_OVERRIDES = {
+    'RF_MAX_DEPTH': 'max_depth',
+    'RF_MAX_SAMPLES': 'max_samples',
+    'RF_MAX_LEAF_NODES': 'max_leaf_nodes',
+    'RF_MAX_FEATURES': 'max_features',
+    'RF_N_JOBS': 'n_jobs',
+}
+
+def _parse_env_value(value: str):
+    """
+    Converte o valor de uma variável de ambiente para int, float ou str;
+    "none" (qualquer caixa) vira None, para remover um limite (ex.: RF_MAX_DEPTH=None).
+    """
+    if value.strip().lower() == "none":
+        return None
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+def apply_memory_caps(hyperparameters: dict) -> dict:
+    """
+    Retorna uma cópia dos hiperparâmetros com os limites de memória aplicados.
+
+    Ordem de precedência: variáveis RF_* > config.yaml > RF_MEMORY_DEFAULTS.
+    """
+    hyperparameters = dict(hyperparameters)
+    for env_var, param in RF_ENV_OVERRIDES.items():
+        value = os.getenv(env_var)
+        if value is not None:
+            hyperparameters[param] = _parse_env_value(value)
+            logger.info('%s=%s definido via %s', param, hyperparameters[param], env_var)
+    for param, default in RF_MEMORY_DEFAULTS.items():
+        if param not in hyperparameters:
+            hyperparameters[param] = default
+            logger.info('%s ausente na configuração; usando padrão %s', param, default)
+    return hyperparameters
+
 def train_model(X, y, test_size: float = 0.2, config_path: str = 'config.yaml'):
     """
     Treina um modelo RandomForestClassifier com os dados fornecidos.
@@ -34,9 +95,10 @@ def train_model(X, y, test_size: float = 0.2, config_path: str = 'config.yaml'):
         config_path: Caminho para o arquivo de configuração YAML.
 
     Returns:
-        modelo treinado, acurácia no conjunto de teste
+        modelo treinado, métricas no conjunto de teste e metadados do split
+        (índices de teste, random_state, test_size, total de amostras)
     """
-    logger.debug(f'Carregando a configuraocao do arquivo: {config_path}')
+    logger.debug('Carregando a configuraocao do arquivo: %s', config_path)
     config = load_config(config_path)
 
     if "model" not in config:
@@ -50,71 +112,75 @@ def train_model(X, y, test_size: float = 0.2, config_path: str = 'config.yaml'):
     random_state = hyperparameters.get("random_state")
     if random_state is None:
         raise ValueError("The 'random_state' parameter must be defined under 'model.hyperparameters'.")
-    logger.info(f'Treinando o modelo: {model_name} com hiperparâmetros: {hyperparameters}')
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    hyperparameters = apply_memory_caps(hyperparameters)
+    logger.info('Treinando o modelo: %s com hiperparâmetros: %s', model_name, hyperparameters)
 
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=test_size, random_state=random_state)
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+    # As árvores do sklearn trabalham em float32 C-contíguo; converter aqui evita
+    # uma cópia extra dentro de fit/predict
+    X_train = np.ascontiguousarray(X_train, dtype=np.float32)
+    X_test = np.ascontiguousarray(X_test, dtype=np.float32)
 
-    logger.info(
-        f"Instantiating model {model_name} with hyperparameters {hyperparameters}"
-    )
+    logger.info("Instantiating model %s with hyperparameters %s", model_name, hyperparameters)
     if model_name == "RandomForest":
         model = RandomForestClassifier(**hyperparameters)
     else:
         raise ValueError(f"Unsupported model '{model_name}' in config.")
 
-    logger.info(f"Fitting model on {X_train.shape[0]} samples")
+    logger.info("Fitting model on %s samples", X_train.shape[0])
     time_start = datetime.now()
-    model.fit(X_train, y_train)
+    # RandomForest já usa Parallel(prefer="threads") (o construtor de árvores
+    # libera a GIL); o backend 'threading' só torna isso explícito
+    with parallel_backend('threading', n_jobs=hyperparameters['n_jobs']):
+        model.fit(X_train, y_train)
     time_end = datetime.now()
-    logger.info(f"Model training completed in {time_end - time_start}")
-    logger.info(f"Predicting on test set with {X_test.shape[0]} samples")
-    y_pred = model.predict(X_test)
+    logger.info("Model training completed in %s", time_end - time_start)
+    logger.info("Predicting on test set with %s samples", X_test.shape[0])
+    with parallel_backend('threading', n_jobs=hyperparameters['n_jobs']):
+        y_pred = model.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
     report = classification_report(
         y_test, y_pred, target_names=["NORMAL", "PNEUMONIA"], output_dict=True
     )
 
-    version_info = watermark.watermark(
-        packages="numpy,scipy,pandas,scikit-learn,opencv-python,boto3"
-    )
     metricas = {
         'accuracy': accuracy,
         'classification_report': report,
-        'version_info': version_info,
+        'version_info': VERSION_INFO,
         'split':{'train': X_train.shape[0],'test': X_test.shape[0]},
         'time_training': (time_end - time_start).total_seconds()
     }
-    logger.info(f"Trainamento completo. Metricas : {metricas}")
-    return model, metricas
+    split_meta = {
+        'test_idx': test_idx,
+        'random_state': random_state,
+        'test_size': test_size,
+        'n_samples': len(X)
+    }
+    logger.info("Trainamento completo. Metricas : %s", metricas)
+    return model, metricas, split_meta
 
-def save_model_to_bucket(s3,bucket_name : str, model, file_name:str):
+def save_model_to_bucket(s3,bucket_name : str, model, file_name:str, meta: dict = None):
     try:
-        data = pickle.dumps(model)
-        s3.put_object(Bucket = bucket_name, Key = file_name, Body = data)
-        logger.info(f'Modelo salvo no bucket {bucket_name} com a chave {file_name}')
+        upload_model(s3, bucket_name, file_name, model)
+        logger.info('Modelo salvo no bucket %s com a chave %s', bucket_name, file_name)
+        if meta is not None:
+            meta_key = meta_key_for(file_name)
+            s3.put_object(Bucket = bucket_name, Key = meta_key, Body = pickle.dumps(meta))
+            logger.info('Metadados do split salvos com a chave %s', meta_key)
+        # Ponteiro para o modelo mais recente: o registro faz um GET em vez de LIST
+        s3.put_object(Bucket = bucket_name, Key = LATEST_MODEL_KEY, Body = file_name.encode())
+        logger.info('Ponteiro %s atualizado para %s', LATEST_MODEL_KEY, file_name)
     except Exception as e:
-        logger.error(f"Erro ao salvar o modelo no bucket: {e}")
+        logger.error("Erro ao salvar o modelo no bucket: %s", e)
         raise
 
 def main():
     execution_env = os.getenv("EXECUTION_ENV", "local")
-    logger.info(f'Execution environment: {execution_env}')
+    logger.info('Execution environment: %s', execution_env)
     try:
         #Configurando s3 com base no ambiente
-        if execution_env == 'cloud':
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id = AWS_ACCESS_KEY_ID,
-                aws_secret_access_key = AWS_SECRET_ACCESS_KEY,
-            )
-        else:
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id = AWS_ACCESS_KEY_ID,
-                aws_secret_access_key = AWS_SECRET_ACCESS_KEY,
-                endpoint_url=MLFLOW_S3_ENDPOINT_URL
-            )
+        s3 = get_s3(execution_env)
     
         datasource_bucket = os.getenv('Datasource_bucket', 'datasource')
         dev_models_bucket = os.getenv('Dev_models_bucket', 'dev-models')
@@ -126,24 +192,30 @@ def main():
                 logger.error(msg)
                 raise ValueError(msg)
         
-        X, y = load_data(s3, datasource_bucket, img_size)
-        logger.info(f'Dados carregados: {len(X)} amostras.')
-        model, metrics = train_model(X, y, test_size = 0.2)
+        random_state = load_config()["model"]["hyperparameters"].get("random_state")
+        X, y, data_fingerprint = load_data(s3, datasource_bucket, img_size, random_state=random_state,
+                                           return_fingerprint=True)
+        logger.info('Dados carregados: %s amostras.', len(X))
+        model, metrics, split_meta = train_model(X, y, test_size = 0.2)
+        # o registro só reaproveita test_idx se carregar exatamente estes X/y
+        split_meta['data_fingerprint'] = data_fingerprint
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         file_name = f'model_{timestamp}.pkl'
-        save_model_to_bucket(s3, dev_models_bucket, model, file_name)
+        save_model_to_bucket(s3, dev_models_bucket, model, file_name, meta = split_meta)
         auto_register = os.getenv("AUTO_REGISTER", "false").lower() == "true"
-        logger.info(f"AUTO_REGISTER flag is {auto_register}")
+        logger.info("AUTO_REGISTER flag is %s", auto_register)
         if auto_register:
-            logger.info("Calling model_reg.py")
-            result = subprocess.run(
-                ["python", "model_reg.py"], capture_output=True, text=True
-            )
-            logger.info(
-                f"model_reg.py output -- stdout: {result.stdout}, stderr: {result.stderr}, returncode: {result.returncode}"
-            )
-            if result.returncode != 0:
-                logger.error(f"model_reg.py failed with return code {result.returncode}")
+            # Registro no mesmo processo: reaproveita modelo e dados já em memória
+            # em vez de subir outro interpretador e baixar tudo de novo do S3
+            logger.info("Calling model_reg.main")
+            import model_reg
+            try:
+                model_reg.main(
+                    specific_model_name=file_name, auto=True,
+                    preloaded=(model, split_meta, X, y)
+                )
+            except Exception:
+                logger.exception("model_reg.main failed")
         else:
             logger.info("Skipping registration (AUTO_REGISTER disabled)")
 
@@ -2,7 +2,9 @@ import os
 import re 
 import pickle 
 import logging 
-import boto3
+import numpy as np
+from joblib import parallel_backend
+from botocore.exceptions import ClientError
 import mlflow
 import mlflow.sklearn
 from dotenv import load_dotenv
@@ -10,20 +12,22 @@ from mlflow.tracking import MlflowClient
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.model_selection import train_test_split
 from utils.config_reader import load_config
+from utils.s3_client import get_s3
 from utils.data_utils import load_data
-from utils.bucket_utils import wait_for_bucket
+from utils.serialization_utils import download_model
+from utils.bucket_utils import LATEST_MODEL_KEY, meta_key_for, wait_for_bucket
 
 #Load .env and AWS credentials
 load_dotenv()
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-MLFLOW_S3_ENDPOINT_URL = os.getenv("MLFLOW_S3_ENDPOINT_URL")
 MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI")
 
 #Configure standard logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('model-registry')
 
+# Model artifacts are saved as model_<YYYYmmdd_HHMMSS>.pkl
+MODEL_KEY_PATTERN = re.compile(r'model_(\d{8}_\d{6})\.pkl')
+
 def load_model_from_bucket(s3, bucket_name: str, specific_filename: str = None):
     """
     Carrega o modelo mais recente do bucket S3/MinIO.
@@ -33,46 +37,88 @@ def load_model_from_bucket(s3, bucket_name: str, specific_filename: str = None):
         bucket_name: nome do bucket.
         specific_filename: nome específico do arquivo de modelo (opcional).
     Returns:
-        modelo carregado
+        (modelo carregado, metadados do split ou None se ausentes)
     """
-    logger.info(f"Carregando modelo do bucket: {bucket_name}")
+    logger.info("Carregando modelo do bucket: %s", bucket_name)
     if specific_filename:
-        response = s3.get_object(Bucket=bucket_name, Key=specific_filename)
-        logger.info(f"Carregando modelo específico: {specific_filename}")
-        return pickle.loads(response['Body'].read())
-    response = s3.list_objects_v2(Bucket=bucket_name)
-
-    if 'Contents' not in response:
-        msg = f'No file found in the bucket {bucket_name}'
-        logger.error(msg)
-        raise ValueError(msg)
+        logger.info("Carregando modelo específico: %s", specific_filename)
+        return download_model(s3, bucket_name, specific_filename), load_split_meta(s3, bucket_name, specific_filename)
+    # Fast path: the LATEST pointer written by save_model_to_bucket
+    try:
+        selected = s3.get_object(Bucket=bucket_name, Key=LATEST_MODEL_KEY)["Body"].read().decode()
+        logger.info("Modelo selecionado via %s: %s", LATEST_MODEL_KEY, selected)
+        return download_model(s3, bucket_name, selected), load_split_meta(s3, bucket_name, selected)
+    except ClientError:
+        logger.info("Ponteiro %s ausente; listando o bucket", LATEST_MODEL_KEY)
 
-    pattern = re.compile(r'model_(\d{8}_\d{6})\.pkl')
-    models = [
-        (obj["Key"], pattern.match(obj["Key"]).group(1))
-        for obj in response["Contents"]
-        if pattern.match(obj["Key"])
-    ]     
-    if not models:
+    # Single pass over the listing; the regex runs once per key and max()
+    # keeps the latest timestamp without building or sorting a list
+    paginator = s3.get_paginator('list_objects_v2')
+    candidates = (
+        (m.group(1), key)
+        for page in paginator.paginate(Bucket=bucket_name, Prefix='model_')
+        for obj in page.get('Contents', ())
+        if (m := MODEL_KEY_PATTERN.fullmatch(key := obj["Key"]))
+    )
+    latest = max(candidates, default=None)
+    if latest is None:
         msg = f'No model files found in the bucket {bucket_name}'
         logger.error(msg)
         raise ValueError(msg)
+    selected = latest[1]
+
+    logger.info("Modelo selecionado: %s", selected)
+    return download_model(s3, bucket_name, selected), load_split_meta(s3, bucket_name, selected)
+
+def load_split_meta(s3, bucket_name: str, model_key: str):
+    """
+    Carrega os metadados do split salvos junto ao modelo (índices de teste, random_state).
 
-    #Pick the latest by timestamp
-    models.sort(key = lambda x: x[1], reverse = True)
-    selected = models[0][0]
-    logger.info(f"Modelo selecionado: {selected}")
-    data = s3.get_object(Bucket = bucket_name, Key = selected)["Body"].read()
+    Returns:
+        dict com os metadados, ou None se o modelo foi salvo sem eles.
+    """
+    meta_key = meta_key_for(model_key)
+    try:
+        data = s3.get_object(Bucket=bucket_name, Key=meta_key)["Body"].read()
+    except ClientError:
+        logger.warning("Metadados do split não encontrados: %s", meta_key)
+        return None
     return pickle.loads(data)
 
-def evaluate_model(model, X, y, test_size : float, random_state: int = 42):
+def select_test_set(X, y, meta, test_size: float = 0.2, random_state: int = None, data_fingerprint: str = None):
+    """
+    Seleciona o conjunto de teste usado no treino.
+
+    Usa os índices salvos em `meta` apenas quando a impressão digital dos dados
+    carregados (ver load_data) é a mesma do treino; caso contrário refaz o
+    split com o random_state salvo (ou o da configuração).
+    """
+    if (meta is not None and meta.get("n_samples") == len(X)
+            and data_fingerprint is not None and meta.get("data_fingerprint") == data_fingerprint):
+        test_idx = meta["test_idx"]
+        return X[test_idx], y[test_idx]
+    if meta is not None:
+        logger.warning(
+            "Metadados do split (%s amostras, dados %s) não correspondem aos dados carregados "
+            "(%s amostras, dados %s); refazendo o split",
+            meta.get('n_samples'), meta.get('data_fingerprint'), len(X), data_fingerprint
+        )
+        random_state = meta.get("random_state", random_state)
+        test_size = meta.get("test_size", test_size)
+    _, X_test, _, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    return X_test, y_test
+
+def evaluate_model(model, X_test, y_test):
     logger.info("Avaliando o modelo carregado")
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
-    y_pred = model.predict(X_test)
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = -1
+    X_test = np.ascontiguousarray(X_test, dtype=np.float32)
+    with parallel_backend('threading', n_jobs=-1):
+        y_pred = model.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
-    logger.info(f"Accuracy: {accuracy}")
+    logger.info("Accuracy: %s", accuracy)
     report = classification_report(y_test, y_pred)
-    logger.info(f"Classification Report:\n{report}")
+    logger.info("Classification Report:\n%s", report)
     return accuracy, report
 
 def should_register_as_experiment_only(auto: bool, accuracy: float) -> bool:
@@ -87,19 +133,19 @@ def should_register_as_experiment_only(auto: bool, accuracy: float) -> bool:
         True se deve registrar apenas como experimento, False se deve registrar na model registry.
     """
     if auto and accuracy < 0.5:
-        logger.warning(f'Accuracy {accuracy} below threshold, registering as experiment only.')
+        logger.warning('Accuracy %s below threshold, registering as experiment only.', accuracy)
         return True
     if not auto:
         # interactive fallback
         choice = input("Promote to Production? (Yes/No): ").strip().lower()
         do_experiment = (choice != "yes")
-        logger.info(f"User chose to promote: {not do_experiment}")
+        logger.info("User chose to promote: %s", not do_experiment)
         return do_experiment
 
     return False
 
 def register_model(model, accuracy: float, report: dict, promote_to_production: bool, execution_env: str, config_path: str = "config.yaml"):
-    logger.info(f"Starting MLflow registration. Promote to production: {promote_to_production}")
+    logger.info("Starting MLflow registration. Promote to production: %s", promote_to_production)
     config = load_config(config_path)
     model_name = config.get("model", {}).get("name")
     if not model_name:
@@ -107,9 +153,9 @@ def register_model(model, accuracy: float, report: dict, promote_to_production:
         logger.error(msg)
         raise ValueError(msg)
 
-    logger.info(f"Setting MLflow registry URI: {MLFLOW_TRACKING_URI}")
+    logger.info("Setting MLflow registry URI: %s", MLFLOW_TRACKING_URI)
     mlflow.set_registry_uri(MLFLOW_TRACKING_URI)
-    logger.info(f"Setting MLflow tracking URI: {MLFLOW_TRACKING_URI}")
+    logger.info("Setting MLflow tracking URI: %s", MLFLOW_TRACKING_URI)
     mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
     logger.info("Setting experiment: Model_Experiment")
     mlflow.set_experiment("Model_Experiment")
@@ -122,7 +168,7 @@ def register_model(model, accuracy: float, report: dict, promote_to_production:
         mlflow.log_metric("accuracy", accuracy)
         mlflow.log_dict(report, "classification_report.json")
         mlflow.sklearn.log_model(model, "model", registered_model_name=model_name)
-        logger.info(f"Model logged to MLflow with run_id: {run.info.run_id}")
+        logger.info("Model logged to MLflow with run_id: %s", run.info.run_id)
 
         if promote_to_production:
             client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
@@ -135,64 +181,69 @@ def register_model(model, accuracy: float, report: dict, promote_to_production:
                     stage="Production",
                     archive_existing_versions=True
                 )
-                logger.info(
-                    f"Promoted model version {latest.version} to Production"
-                )
+                logger.info("Promoted model version %s to Production", latest.version)
             else:
-                logger.warning(f"No model versions found for model '{model_name}' to promote.")
+                logger.warning("No model versions found for model '%s' to promote.", model_name)
         else:
-            logger.info(f"Registered model '{model_name}' as experiment only.")
+            logger.info("Registered model '%s' as experiment only.", model_name)
 
 
-def main(specific_model_name: str = None, auto: bool = True):
+def main(specific_model_name: str = None, auto: bool = True, preloaded: tuple = None):
+    """
+    Avalia e registra um modelo no MLflow.
+
+    Args:
+        specific_model_name: chave do modelo no bucket (opcional; padrão é o mais recente).
+        auto: se True, decide a promoção pela acurácia, sem interação.
+        preloaded: tupla (model, split_meta, X, y) já em memória (ex.: vinda de
+            model_init); quando fornecida, o modelo e os dados não são baixados de novo.
+    """
     execution_env = os.getenv("EXECUTION_ENVIRONMENT", "local")
-    logger.info(f"Script start. Auto mode: {auto}, Execution: {execution_env}")
-    logger.info(f"MLFLOW_TRACKING_URI: {MLFLOW_TRACKING_URI}")
-    logger.info(f"Environment variables: {dict(os.environ)}")
+    logger.info("Script start. Auto mode: %s, Execution: %s", auto, execution_env)
+    logger.info("MLFLOW_TRACKING_URI: %s", MLFLOW_TRACKING_URI)
+    logger.debug("Environment variable names: %s", list(os.environ.keys()))
     try:
-        # Configure S3 client based on environment
-        if execution_env == "cloud":
-            s3 = boto3.client(
-                "s3",
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-            )
+        random_state = load_config()["model"]["hyperparameters"].get("random_state")
+        if preloaded is not None:
+            model, split_meta, X, y = preloaded
+            # mesmos X/y do treino, por construção
+            data_fingerprint = split_meta.get("data_fingerprint") if split_meta else None
+            logger.info("Using preloaded model and data")
         else:
-            s3 = boto3.client(
-                "s3",
-                endpoint_url=MLFLOW_S3_ENDPOINT_URL,
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-            )
-
-        # Get bucket names from environment or use defaults
-        datasource_bucket = os.getenv("DATASOURCE_BUCKET", "datasource")
-        dev_models_bucket = os.getenv("DEV_MODELS_BUCKET", "dev-models")
-
-        # ensure buckets exist
-        for bucket in (dev_models_bucket, datasource_bucket):
-            if not wait_for_bucket(s3, bucket):
-                msg = f"Bucket '{bucket}' not found"
-                logger.error(msg)
-                raise ValueError(msg)
-
-        model = load_model_from_bucket(s3, dev_models_bucket, specific_model_name)
-        logger.info("Model loaded successfully")
-        
-        X, y = load_data(s3, datasource_bucket, (64, 64))
-        logger.info("Data loaded successfully")
-        
-        accuracy, report = evaluate_model(model, X, y)
-        logger.info(f"Model evaluated. Accuracy: {accuracy}")
+            # Configure S3 client based on environment
+            s3 = get_s3(execution_env)
+
+            # Get bucket names from environment or use defaults
+            datasource_bucket = os.getenv("DATASOURCE_BUCKET", "datasource")
+            dev_models_bucket = os.getenv("DEV_MODELS_BUCKET", "dev-models")
+
+            # ensure buckets exist
+            for bucket in (dev_models_bucket, datasource_bucket):
+                if not wait_for_bucket(s3, bucket):
+                    msg = f"Bucket '{bucket}' not found"
+                    logger.error(msg)
+                    raise ValueError(msg)
+
+            model, split_meta = load_model_from_bucket(s3, dev_models_bucket, specific_model_name)
+            logger.info("Model loaded successfully")
+
+            X, y, data_fingerprint = load_data(s3, datasource_bucket, (64, 64), random_state=random_state,
+                                               return_fingerprint=True)
+            logger.info("Data loaded successfully")
+
+        X_test, y_test = select_test_set(X, y, split_meta, random_state=random_state,
+                                         data_fingerprint=data_fingerprint)
+        accuracy, report = evaluate_model(model, X_test, y_test)
+        logger.info("Model evaluated. Accuracy: %s", accuracy)
 
         promote_to_prod = not should_register_as_experiment_only(auto, accuracy)
-        logger.info(f"Will promote to production: {promote_to_prod}")
+        logger.info("Will promote to production: %s", promote_to_prod)
         
         try:
             register_model(model, accuracy, report, promote_to_prod, execution_env)
             logger.info("Model registration completed successfully")
         except Exception as e:
-            logger.error(f"Model registration failed: {str(e)}")
+            logger.error("Model registration failed: %s", str(e))
             logger.exception("Full traceback:")
             raise
 
@@ -1,5 +1,44 @@
+import hashlib
+import io
+import random
+import tarfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 import botocore as bt
+import cv2
+import numpy as np
+
+# Concurrent S3 GETs per load; keep in sync with max_pool_connections on the client
+MAX_WORKERS = 32
+# Size of each ranged GET when pulling a tar shard
+SHARD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Names used once per image, bound here to skip repeated attribute lookups
+_imdecode = cv2.imdecode
+_resize = cv2.resize
+_frombuffer = np.frombuffer
+_IMREAD_COLOR = cv2.IMREAD_COLOR
+_IMREAD_REDUCED_COLOR_8 = cv2.IMREAD_REDUCED_COLOR_8
+_UINT8 = np.uint8
+
+
+def _wait_for_head_bucket(s3_client, bucket_name, timeout, initial_delay=0.1, max_delay=2.0):
+    """Poll head_bucket with exponential backoff and jitter.
+
+    Returns:
+        True as soon as head_bucket succeeds, False once timeout elapses.
+    """
+    start_time = time.time()
+    delay = initial_delay
+    while time.time() - start_time < timeout:
+        try:
+            s3_client.head_bucket(Bucket=bucket_name)
+            return True
+        except bt.exceptions.ClientError:
+            # Bucket not available yet; back off (with jitter) and retry
+            time.sleep(delay + random.random() * 0.05)
+            delay = min(delay * 2, max_delay)
+    return False
 
 
 def wait_for_bucket_deletion(s3_client, bucket_name, timeout=60):
@@ -14,16 +53,9 @@ def wait_for_bucket_deletion(s3_client, bucket_name, timeout=60):
         True if the bucket was found (head_bucket succeeded) within the timeout,
         False otherwise.
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            s3_client.head_bucket(Bucket=bucket_name)
-            # If head_bucket succeeds, the bucket exists / is available
-            print(f'Bucket {bucket_name} is available')
-            return True
-        except bt.exceptions.ClientError:
-            # Bucket not available yet; wait and retry
-            time.sleep(5)
+    if _wait_for_head_bucket(s3_client, bucket_name, timeout):
+        print(f'Bucket {bucket_name} is available')
+        return True
     return False
 
 
@@ -40,45 +72,281 @@ def wait_for_bucket(s3_client, bucket_name, timeout=60):
     Returns:
         True if the bucket became available within timeout, False otherwise.
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            s3_client.head_bucket(Bucket=bucket_name)
-            return True
-        except bt.exceptions.ClientError:
-            time.sleep(2)
-    return False
+    return _wait_for_head_bucket(s3_client, bucket_name, timeout)
+
+
+# Object holding the key of the most recently saved model
+LATEST_MODEL_KEY = 'LATEST'
+
+
+def meta_key_for(model_key):
+    """Return the sibling key holding a model's train/test split metadata.
+
+    Example: "model_20240101_120000.pkl" -> "model_20240101_120000.meta.pkl".
+    """
+    if model_key.endswith('.pkl'):
+        model_key = model_key[:-len('.pkl')]
+    return model_key + '.meta.pkl'
+
+
+def _decode_bytes(file_bytes, img_size, dst=None):
+    """Decode raw image bytes and resize them to img_size.
+
+    When dst is given (a C-contiguous uint8 array of shape (height, width, 3)),
+    OpenCV writes the resized image straight into it with no extra allocation.
+
+    Like the webapp's /diagnose, images are decoded already downscaled 1/8
+    (DCT scaling for JPEG) and only re-decoded at full size when the reduced
+    image would no longer cover img_size, so training and serving resize
+    from the same intermediate resolution.
+
+    Returns:
+        The resized BGR image (dst itself when given), or None if the bytes
+        could not be decoded.
+    """
+    buf = _frombuffer(file_bytes, _UINT8)
+    img = _imdecode(buf, _IMREAD_REDUCED_COLOR_8)
+    if img is not None and (img.shape[1] < img_size[0] or img.shape[0] < img_size[1]):
+        img = _imdecode(buf, _IMREAD_COLOR)
+    if img is None:
+        return None
+    return _resize(img, img_size, dst=dst)
 
 
-def load_images_from_bucket(s3, bucket, prefix, label, img_size):
-    """Load images from an S3 bucket.
+def _decode_image(s3, bucket, key, img_size, dst=None):
+    """Download and decode a single image object.
+
+    Returns:
+        The resized BGR image, or None if the object could not be decoded.
+    """
+    file_bytes = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return _decode_bytes(file_bytes, img_size, dst)
+
+
+def list_image_keys(s3, bucket, prefix):
+    """List every object key under a prefix, following pagination.
 
     Args:
         s3: Boto3 S3 client.
         bucket: Name of the S3 bucket.
         prefix: Prefix (folder path) in the S3 bucket.
+
+    Returns:
+        A list of object keys, skipping folder placeholders.
+    """
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj.get("Key")
+            if not key or key.endswith('/'):
+                continue  # skip folders or invalid keys
+            keys.append(key)
+    return keys
+
+
+def bucket_fingerprint(s3, bucket, prefixes):
+    """Hash the (Key, ETag) pairs under the given prefixes.
+
+    Only the listing is read, so this is cheap; the result changes whenever an
+    object is added, removed or rewritten.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        prefixes: Key prefixes to include.
+
+    Returns:
+        A hex digest identifying the current contents.
+    """
+    digest = hashlib.sha256()
+    paginator = s3.get_paginator('list_objects_v2')
+    for prefix in sorted(prefixes):
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                digest.update(f"{obj['Key']}|{obj.get('ETag', '')}\n".encode())
+    return digest.hexdigest()
+
+
+def load_images_from_bucket(s3, bucket, keys, label, img_size, out_X, out_y, start_idx,
+                            max_workers=MAX_WORKERS):
+    """Load images from an S3 bucket into preallocated arrays.
+
+    Objects are downloaded and decoded concurrently; the boto3 client is
+    thread-safe and shared between workers. Each worker resizes directly
+    into its own row of out_X.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        keys: Object keys to load (see list_image_keys).
+        label: Label to assign to the images.
+        img_size: Size to which images should be resized (width, height).
+        out_X: Preallocated uint8 array of shape (N, height, width, 3).
+        out_y: Preallocated label array of shape (N,).
+        start_idx: First row of out_X/out_y to write to.
+        max_workers: Number of concurrent downloads (default: MAX_WORKERS).
+
+    Returns:
+        Number of images written; undecodable objects are skipped.
+    """
+    # Parallelism comes from the thread pool; one OpenCV thread per call
+    # avoids oversubscribing the cores
+    cv2.setNumThreads(1)
+
+    def _load(i):
+        return _decode_image(s3, bucket, keys[i], img_size, dst=out_X[start_idx + i]) is not None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        ok = list(executor.map(_load, range(len(keys))))
+
+    return compact_loaded_rows(out_X, out_y, start_idx, ok, label)
+
+
+def compact_loaded_rows(out_X, out_y, start_idx, ok, label):
+    """Close the gaps left by rows that failed to load and set their labels.
+
+    Args:
+        out_X: Preallocated image array written row by row.
+        out_y: Preallocated label array.
+        start_idx: First row written by the loader.
+        ok: One boolean per attempted row, True if it was written.
+        label: Label to assign to the loaded rows.
+
+    Returns:
+        Number of rows loaded, now stored contiguously from start_idx.
+    """
+    count = sum(ok)
+    if count < len(ok):
+        valid = [start_idx + i for i, loaded in enumerate(ok) if loaded]
+        out_X[start_idx:start_idx + count] = out_X[valid]
+    out_y[start_idx:start_idx + count] = label
+    return count
+
+
+def shard_exists(s3, bucket, key):
+    """Check whether a shard object exists in the bucket.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        key: Key of the shard object.
+
+    Returns:
+        True if the object exists, False otherwise.
+    """
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except bt.exceptions.ClientError:
+        return False
+
+
+def shard_member_count(s3, bucket, key):
+    """Read the member count stored in a shard's `count` metadata.
+
+    create-bucket.sh records it at upload time so the loader can size its
+    arrays without downloading the shard first.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        key: Key of the shard object.
+
+    Returns:
+        The number of members, or None if the shard is missing or has no count.
+    """
+    try:
+        metadata = s3.head_object(Bucket=bucket, Key=key).get('Metadata', {})
+    except bt.exceptions.ClientError:
+        return None
+    try:
+        return int(metadata['count'])
+    except (KeyError, ValueError):
+        return None
+
+
+def download_object_ranged(s3, bucket, key, chunk_size=SHARD_CHUNK_SIZE, max_workers=MAX_WORKERS):
+    """Download an object using parallel byte-range GET requests.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        key: Key of the object.
+        chunk_size: Size in bytes of each ranged request.
+        max_workers: Number of concurrent ranged requests.
+
+    Returns:
+        A BytesIO positioned at the start of the object contents.
+    """
+    size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+    buf = bytearray(size)
+
+    def _fetch(start):
+        end = min(start + chunk_size, size) - 1
+        body = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')['Body'].read()
+        buf[start:start + len(body)] = body
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() propagates any exception raised by a worker
+        list(executor.map(_fetch, range(0, size, chunk_size)))
+
+    return io.BytesIO(buf)
+
+
+def open_shard(s3, bucket, shard_key):
+    """Download a tar shard and open it in memory.
+
+    Args:
+        s3: Boto3 S3 client.
+        bucket: Name of the S3 bucket.
+        shard_key: Key of the tar shard (e.g. "Normal.tar").
+
+    Returns:
+        A tuple (tarfile.TarFile, list of regular-file members).
+    """
+    tar = tarfile.open(fileobj=download_object_ranged(s3, bucket, shard_key), mode='r:')
+    return tar, [member for member in tar.getmembers() if member.isfile()]
+
+
+def load_images_from_shards(shards, label, img_size, out_X, out_y, start_idx, max_workers=MAX_WORKERS):
+    """Load images packed into tar shards into preallocated arrays.
+
+    Shards are pulled with parallel ranged GETs (see open_shard) and their
+    members are decoded in memory, which avoids paying per-object request
+    latency for every image. Member bytes are read serially (TarFile is not
+    thread-safe), then decoded and resized concurrently like
+    load_images_from_bucket. Each shard's buffer is released once read.
+
+    Args:
+        shards: (tar, members) tuples as returned by open_shard.
         label: Label to assign to the images.
         img_size: Size to which images should be resized (width, height).
+        out_X: Preallocated uint8 array of shape (N, height, width, 3).
+        out_y: Preallocated label array of shape (N,).
+        start_idx: First row of out_X/out_y to write to.
+        max_workers: Number of concurrent decodes (default: MAX_WORKERS).
 
     Returns:
-        A list of tuples (flattened_image_array, label).
+        Number of images written; undecodable members are skipped.
     """
-    import cv2
-    import numpy as np
-
-    data = []
-    response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-    for obj in response.get('Contents', []):
-        key = obj.get("Key")
-        if not key or key.endswith('/'):
-            continue  # skip folders or invalid keys
-        obj_response = s3.get_object(Bucket=bucket, Key=key)
-        file_bytes = obj_response['Body'].read()
-        np_array = np.frombuffer(file_bytes, np.uint8)
-        img = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        if img is not None:
-            img = cv2.resize(img, img_size)
-            img_flat = img.flatten()
-            data.append((img_flat, label))
-
-    return data
\ No newline at end of file
+    cv2.setNumThreads(1)
+
+    count = 0
+    for tar, members in shards:
+        first = start_idx + count
+        if first + len(members) > len(out_X):
+            raise ValueError(f"Shard has {len(members)} members but only {len(out_X) - first} rows are left.")
+        with tar:
+            blobs = [tar.extractfile(member).read() for member in members]
+        # TarFile.close() leaves a caller-supplied fileobj open; drop the shard buffer now
+        tar.fileobj.close()
+
+        def _load(i):
+            return _decode_bytes(blobs[i], img_size, dst=out_X[first + i]) is not None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            ok = list(executor.map(_load, range(len(blobs))))
+        del blobs
+        count += compact_loaded_rows(out_X, out_y, first, ok, label)
+    return count
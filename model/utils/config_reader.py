@@ -1,12 +1,25 @@
+import copy
+import functools
 import yaml
-import os 
+import os
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml C binding
+except ImportError:
+    from yaml import SafeLoader
+
+@functools.lru_cache(maxsize=4)
+def _load_yaml(config_path, mtime):
+    """Faz o parse do YAML; a chave inclui o mtime para invalidar quando o arquivo muda."""
+    with open(config_path, 'r') as file:
+        return yaml.load(file, Loader=SafeLoader)
 
 def load_config(config_path='config.yaml'):
     """Carrega o arquivo de configuração YAML."""
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Config file not found: {config_path}")
-    
-    with open(config_path, 'r') as file:
-        config = yaml.safe_load(file)
+
+    # cópia para que os chamadores possam alterar o dict sem afetar o cache
+    config = copy.deepcopy(_load_yaml(config_path, os.path.getmtime(config_path)))
     config["model"]["name"] = os.environ.get("MODEL_NAME", config["model"]["name"])
-    return config
\ No newline at end of file
+    return config
@@ -1,58 +1,219 @@
 # ...existing code...
+import hashlib
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from random import shuffle
 from PIL import Image
-from .bucket_utils import load_images_from_bucket
+from .bucket_utils import (
+    MAX_WORKERS,
+    bucket_fingerprint,
+    compact_loaded_rows,
+    list_image_keys,
+    load_images_from_bucket,
+    load_images_from_shards,
+    open_shard,
+    shard_exists,
+    shard_member_count,
+)
 
-def _load_images_from_dir(dir_path, label, img_size):
-    imgs = []
+# Cache em disco do dataset decodificado (ver load_data)
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", ".cache/xray")
+# Versão do pipeline de leitura (decode/resize/embaralhamento); faz parte da
+# chave do cache, então incremente ao mudar como as imagens viram X/y
+LOADER_VERSION = 3
+
+def _list_image_files(dir_path):
     if not os.path.isdir(dir_path):
-        return imgs
-    for fname in os.listdir(dir_path):
-        fpath = os.path.join(dir_path, fname)
-        if not os.path.isfile(fpath):
-            continue
-        try:
-            img = Image.open(fpath).convert("RGB").resize((img_size, img_size))
-            imgs.append((np.array(img), label))
-        except Exception:
+        return []
+    paths = (os.path.join(dir_path, fname) for fname in os.listdir(dir_path))
+    # ordenado para que a ordem (e o embaralhamento com semente) seja reprodutível
+    return sorted(fpath for fpath in paths if os.path.isfile(fpath))
+
+def _read_local_image(fpath, img_size, dst):
+    """Lê uma imagem local para dst; retorna False se não for possível decodificá-la."""
+    try:
+        with Image.open(fpath) as img:
+            # em JPEG, draft() faz o decoder já entregar a imagem reduzida (escala DCT)
+            img.draft("RGB", img_size)
+            dst[...] = np.asarray(img.convert("RGB").resize(img_size, Image.BILINEAR))
+        return True
+    except Exception:
+        return False
+
+def _load_images_from_dir(paths, label, img_size, out_X, out_y, start_idx, max_workers=MAX_WORKERS):
+    """Escreve as imagens em out_X/out_y a partir de start_idx; retorna quantas foram lidas.
+
+    A decodificação roda em threads (o Pillow libera a GIL ao decodificar e redimensionar).
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        ok = list(executor.map(
+            lambda i: _read_local_image(paths[i], img_size, out_X[start_idx + i]), range(len(paths))
+        ))
+    return compact_loaded_rows(out_X, out_y, start_idx, ok, label)
+
+def _plan_s3_source(s3_client, bucket_name, name):
+    """Prefere o shard `<name>.tar`; se ausente, lista os objetos de `<name>/`.
+
+    Quando o shard traz a contagem de membros nos metadados, o download fica
+    para a leitura (um shard por vez em memória); senão ele é aberto aqui.
+
+    Retorna (tipo, fonte, total de imagens).
+    """
+    shard_key = f"{name}.tar"
+    count = shard_member_count(s3_client, bucket_name, shard_key)
+    if count is not None:
+        return "shard_key", shard_key, count
+    if shard_exists(s3_client, bucket_name, shard_key):
+        tar, members = open_shard(s3_client, bucket_name, shard_key)
+        return "shard", [(tar, members)], len(members)
+    keys = list_image_keys(s3_client, bucket_name, f"{name}/")
+    return "keys", keys, len(keys)
+
+def _local_fingerprint(dirs):
+    """Hash de (caminho, tamanho, mtime) de cada arquivo; muda quando os dados mudam."""
+    digest = hashlib.sha256()
+    for dir_path in dirs:
+        for fpath in _list_image_files(dir_path):
+            st = os.stat(fpath)
+            digest.update(f"{fpath}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def _cache_paths(cache_dir, source, fingerprint, img_size, random_state):
+    """
+    Retorna (X_path, y_path, slot). O slot identifica a fonte/img_size/random_state;
+    o restante do nome muda com os dados e com LOADER_VERSION.
+    """
+    slot = hashlib.sha256(f"{source}|{img_size}|{random_state}".encode()).hexdigest()[:12]
+    data_key = hashlib.sha256(f"{LOADER_VERSION}|{fingerprint}".encode()).hexdigest()[:16]
+    base = os.path.join(cache_dir, f"{slot}_{data_key}")
+    return base + "_X.npy", base + "_y.npy", slot
+
+_CACHE_FILE = re.compile(r"(?:[0-9a-f]{12}_)?[0-9a-f]{16}_[Xy]\.npy(?:\.tmp)?")
+
+def _prune_cache(cache_dir, slot, keep_paths):
+    """Remove entradas superadas: as do mesmo slot com outros dados/versão e as do formato antigo."""
+    keep = {os.path.basename(path) for path in keep_paths}
+    for fname in os.listdir(cache_dir):
+        if fname in keep or not _CACHE_FILE.fullmatch(fname):
             continue
-    return imgs
+        # formato antigo (sem slot) ou mesmo slot com outra chave de dados
+        if fname.startswith(slot + "_") or fname.count("_") == 1:
+            try:
+                os.remove(os.path.join(cache_dir, fname))
+            except OSError:
+                pass
 
-def load_data(s3_client=None, bucket_name=None, img_size=224, local_base="data/xray"):
+def _save_cache(X_path, y_path, X, y):
+    """Grava X/y de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(X_path), exist_ok=True)
+    for path, arr in ((X_path, X), (y_path, y)):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp_path, path)
+
+def load_data(s3_client=None, bucket_name=None, img_size=224, local_base="data/xray", random_state=None,
+              cache_dir=DATA_CACHE_DIR, return_fingerprint=False):
     """
     Carrega dados em ordem de preferência:
     1) Diretório local (ex.: após `dvc pull` -> data/xray/NORMAL e data/xray/PNEUMONIA)
-    2) Bucket S3/MinIO via load_images_from_bucket
+    2) Bucket S3/MinIO: shards tar (`Normal.tar`, `Pneumonia.tar`) quando
+       existirem, senão objetos individuais via load_images_from_bucket
+
+    As fontes são listadas antes da leitura para que X/y sejam alocados uma
+    única vez e preenchidos in-place, sem lista intermediária nem np.stack.
+
+    O resultado é gravado em `cache_dir` como .npy, com chave derivada de uma
+    impressão digital dos dados (ETags no bucket; tamanho/mtime localmente),
+    do img_size, do random_state e de LOADER_VERSION. Ao gravar uma entrada,
+    as superadas (mesma fonte/img_size/random_state com outros dados ou outra
+    versão do loader) são apagadas. Execuções seguintes com os mesmos dados
+    abrem os arquivos com mmap em vez de baixar e decodificar tudo de novo.
 
     Args:
         s3_client: boto3 client (opcional, usado se não houver dados locais)
         bucket_name: nome do bucket (opcional)
-        img_size: tamanho da imagem (quadrada)
+        img_size: tamanho da imagem (int para quadrada ou (largura, altura))
         local_base: base local onde DVC coloca os dados
+        random_state: semente do embaralhamento; com a mesma semente e os mesmos
+            dados a ordem de X/y é reprodutível (necessário para reaproveitar
+            os índices de teste salvos no treino)
+        cache_dir: diretório do cache em disco (padrão: env DATA_CACHE_DIR ou
+            .cache/xray); None desativa o cache
+        return_fingerprint: se True, retorna também uma impressão digital de
+            X/y (dados, fonte, img_size, random_state e LOADER_VERSION); o treino
+            a salva junto dos índices de teste para o registro validá-los
 
     Retorna:
-        X (np.array), y (np.array)
+        X (np.array uint8, uma linha achatada por imagem), y (np.array int8)
+        e, com return_fingerprint, a impressão digital (str)
     """
-    data = []
+    if isinstance(img_size, int):
+        img_size = (img_size, img_size)
+
     normal_dir = os.path.join(local_base, "NORMAL")
     pneumonia_dir = os.path.join(local_base, "PNEUMONIA")
+    use_local = os.path.isdir(normal_dir) and os.path.isdir(pneumonia_dir)
+    if not use_local and (s3_client is None or bucket_name is None):
+        raise RuntimeError("Dados não encontrados localmente e s3_client/bucket_name não fornecidos.")
+
+    X = None
+    if cache_dir or return_fingerprint:
+        if use_local:
+            fingerprint = _local_fingerprint((normal_dir, pneumonia_dir))
+        else:
+            fingerprint = bucket_fingerprint(s3_client, bucket_name, ("Normal", "Pneumonia"))
+        source = os.path.abspath(local_base) if use_local else f"s3://{bucket_name}"
+        X_path, y_path, slot = _cache_paths(cache_dir or "", source, fingerprint, img_size, random_state)
+        dataset_fingerprint = os.path.basename(X_path)[:-len("_X.npy")]
+        if cache_dir and os.path.exists(X_path) and os.path.exists(y_path):
+            X, y = np.load(X_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
 
-    if os.path.isdir(normal_dir) and os.path.isdir(pneumonia_dir):
-        data += _load_images_from_dir(normal_dir, 0, img_size)
-        data += _load_images_from_dir(pneumonia_dir, 1, img_size)
+    if X is None:
+        if use_local:
+            X, y = _read_dataset(None, None, img_size, random_state, local_dirs=(normal_dir, pneumonia_dir))
+        else:
+            X, y = _read_dataset(s3_client, bucket_name, img_size, random_state)
+        if cache_dir:
+            _save_cache(X_path, y_path, X, y)
+            _prune_cache(cache_dir, slot, (X_path, y_path))
+
+    if return_fingerprint:
+        return X, y, dataset_fingerprint
+    return X, y
+
+def _read_dataset(s3_client, bucket_name, img_size, random_state, local_dirs=None):
+    """Lê e decodifica todas as imagens (sem cache); ver load_data."""
+    width, height = img_size
+
+    if local_dirs is not None:
+        sources = [("dir", _list_image_files(dir_path), label) for label, dir_path in enumerate(local_dirs)]
+        totals = [len(paths) for _, paths, _ in sources]
     else:
-        if s3_client is None or bucket_name is None:
-            raise RuntimeError("Dados não encontrados localmente e s3_client/bucket_name não fornecidos.")
         # ajusta os prefixes conforme seu layout no bucket
-        data += load_images_from_bucket(s3_client, bucket_name, "Normal/", 0, img_size)
-        data += load_images_from_bucket(s3_client, bucket_name, "Pneumonia/", 1, img_size)
+        sources, totals = [], []
+        for name, label in (("Normal", 0), ("Pneumonia", 1)):
+            kind, source, total = _plan_s3_source(s3_client, bucket_name, name)
+            sources.append((kind, source, label))
+            totals.append(total)
 
-    shuffle(data)
-    if not data:
-        return np.empty((0, img_size, img_size, 3)), np.empty((0,), dtype=int)
+    X = np.empty((sum(totals), height, width, 3), dtype=np.uint8)
+    y = np.empty(sum(totals), dtype=np.int8)
 
-    X = np.stack([item[0] for item in data])
-    y = np.array([item[1] for item in data], dtype=int)
-    return X, y
+    n = 0
+    for kind, source, label in sources:
+        if kind == "dir":
+            n += _load_images_from_dir(source, label, img_size, X, y, n)
+        elif kind == "shard":
+            n += load_images_from_shards(source, label, img_size, X, y, n)
+        elif kind == "shard_key":
+            shards = [open_shard(s3_client, bucket_name, source)]
+            n += load_images_from_shards(shards, label, img_size, X, y, n)
+        else:
+            n += load_images_from_bucket(s3_client, bucket_name, source, label, img_size, X, y, n)
+
+    # embaralha via permutação de índices, aplicada uma única vez
+    p = np.random.default_rng(random_state).permutation(n)
+    X, y = X[:n][p], y[:n][p]
+    return X.reshape(n, height * width * 3), y
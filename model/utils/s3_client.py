@@ -0,0 +1,37 @@
+import functools
+import os
+import boto3
+from botocore.config import Config
+from .bucket_utils import MAX_WORKERS
+
+# Shared client settings: the pool must hold at least MAX_WORKERS connections
+# so parallel downloads never wait on a free connection
+S3_CONFIG = Config(
+    max_pool_connections=max(64, MAX_WORKERS),
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=30,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3(execution_env: str = "local"):
+    """Return the process-wide S3 client for an execution environment.
+
+    The client is created once from a dedicated boto3 session and reused by
+    every caller (boto3 clients are thread-safe).
+
+    Args:
+        execution_env: 'cloud' for AWS S3; anything else targets the local
+            MinIO endpoint from MLFLOW_S3_ENDPOINT_URL.
+
+    Returns:
+        A boto3 S3 client.
+    """
+    session = boto3.session.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    endpoint_url = None if execution_env == "cloud" else os.getenv("MLFLOW_S3_ENDPOINT_URL")
+    return session.client('s3', config=S3_CONFIG, endpoint_url=endpoint_url)
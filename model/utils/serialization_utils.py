@@ -0,0 +1,107 @@
+import io
+import pickle
+import struct
+from boto3.s3.transfer import TransferConfig
+import zstandard as zstd
+
+# Frame magic number written at the start of every zstd stream
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Header of artifacts pickled with protocol 5 out-of-band buffers (see dump_model)
+OOB_MAGIC = b'XRAYPB5\n'
+_FRAME_LEN = struct.Struct('<Q')
+
+# Multipart settings for model artifacts (a 100-tree forest is easily >100 MB)
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=10,
+)
+
+
+def _read_exact(reader, size):
+    """Read exactly size bytes into a new writable buffer."""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = reader.readinto(view[pos:])
+        if not n:
+            raise EOFError("Truncated model artifact")
+        pos += n
+    return buf
+
+
+def dump_model(model, level=3):
+    """Pickle a model straight into a zstd-compressed in-memory buffer.
+
+    The model is pickled with protocol 5 and out-of-band buffers, so the
+    forest's numpy arrays are never copied into the pickle stream; each one
+    is written as its own length-prefixed frame after the pickle bytes.
+
+    Args:
+        model: Object to serialize.
+        level: zstd compression level (default: 3).
+
+    Returns:
+        A BytesIO positioned at the start of the compressed stream.
+    """
+    buffers = []
+    data = pickle.dumps(model, protocol=5, buffer_callback=buffers.append)
+
+    buf = io.BytesIO()
+    cctx = zstd.ZstdCompressor(level=level, threads=-1)
+    with cctx.stream_writer(buf, closefd=False) as writer:
+        writer.write(OOB_MAGIC)
+        writer.write(_FRAME_LEN.pack(len(buffers)))
+        writer.write(_FRAME_LEN.pack(len(data)))
+        writer.write(data)
+        for pickle_buffer in buffers:
+            raw = pickle_buffer.raw()
+            writer.write(_FRAME_LEN.pack(raw.nbytes))
+            writer.write(raw)
+    buf.seek(0)
+    return buf
+
+
+def load_model(buf):
+    """Unpickle a model written by dump_model.
+
+    Artifacts written by earlier versions (a zstd-compressed pickle, or a
+    plain uncompressed pickle) are still accepted.
+
+    Args:
+        buf: Binary file-like object positioned at the start of the artifact.
+
+    Returns:
+        The deserialized model.
+    """
+    if buf.read(len(ZSTD_MAGIC)) != ZSTD_MAGIC:
+        buf.seek(0)
+        return pickle.load(buf)
+    buf.seek(0)
+    with zstd.ZstdDecompressor().stream_reader(buf) as reader:
+        head = reader.read(len(OOB_MAGIC))
+        if head != OOB_MAGIC:
+            return pickle.loads(head + reader.read())
+        n_buffers, = _FRAME_LEN.unpack(_read_exact(reader, _FRAME_LEN.size))
+        data_len, = _FRAME_LEN.unpack(_read_exact(reader, _FRAME_LEN.size))
+        data = _read_exact(reader, data_len)
+        buffers = []
+        for _ in range(n_buffers):
+            size, = _FRAME_LEN.unpack(_read_exact(reader, _FRAME_LEN.size))
+            buffers.append(_read_exact(reader, size))
+    return pickle.loads(data, buffers=buffers)
+
+
+def upload_model(s3, bucket_name, key, model):
+    """Serialize a model with dump_model and upload it using multipart transfers."""
+    s3.upload_fileobj(dump_model(model), bucket_name, key, Config=TRANSFER_CONFIG)
+
+
+def download_model(s3, bucket_name, key):
+    """Download a model artifact using ranged multipart transfers and deserialize it."""
+    buf = io.BytesIO()
+    s3.download_fileobj(bucket_name, key, buf, Config=TRANSFER_CONFIG)
+    buf.seek(0)
+    return load_model(buf)
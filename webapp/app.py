@@ -5,16 +5,26 @@ try:
 except Exception:
     # mlflow.sklearn may not be importable in some environments; fall back to None
     mlflow_sklearn = None
+import base64
+import hashlib
 import numpy as np
+import orjson
 import cv2
+import mmap
+import os
 import time
-import traceback
+import threading
 import logging
 import sys
+from mlflow.exceptions import MlflowException
 from mlflow.tracking import MlflowClient
 from utils.logging_formatter import configure_fluent_logging
+from utils.batching import ModelHost
 
 app = Flask(__name__)
+# Browser/proxy cache lifetime (seconds) for /static files and the index page
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = STATIC_MAX_AGE
 
 # ---- Unified Logging Setup ----
 logging.basicConfig(
@@ -33,7 +43,6 @@ logger = configure_fluent_logging(
 
 
 # Configure MLflow URIs from environment
-import os
 mlflow_uri = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000")
 
 # Set headers for ALB routing if using ALB DNS
@@ -43,28 +52,87 @@ if "elb.amazonaws.com" in mlflow_uri:
 mlflow.set_tracking_uri(mlflow_uri)
 mlflow.set_registry_uri(mlflow_uri)
 
-def get_current_model_info(model_name="RandomForest", stage="Production"):
+# Input geometry expected by the model: 64x64 grayscale, flattened
+IMG_SIZE = 64
+N_FEATURES = IMG_SIZE * IMG_SIZE
+
+# Single client reused by every lookup (construction re-reads env and sets up HTTP sessions)
+mlflow_client = MlflowClient()
+
+# Last successful registry lookup per (model, stage), shared by /model-info and
+# the startup polling: /model-info is served from it for MODEL_INFO_TTL seconds
+# instead of hitting the MLflow server on every page load
+MODEL_INFO_TTL = 30
+_model_versions_cache = {}
+_model_versions_lock = threading.Lock()
+
+def invalidate_model_info_cache():
+    with _model_versions_lock:
+        _model_versions_cache.clear()
+
+def _get(v, field):
+    # Mlflow may return model version objects or dicts depending on client version
+    if isinstance(v, dict):
+        return v.get(field)
+    return getattr(v, field, None)
+
+def _version_int(v):
+    try:
+        return int(_get(v, "version") or -1)
+    except Exception:
+        return -1
+
+def _query_latest_version(model_name, stage):
+    """
+    Ask the registry for the version to serve: the newest one in `stage`, or
+    the newest version overall when nothing is in that stage.
+
+    Returns:
+        (version, model_uri), or None when the model has no versions.
     """
-    Query MLflow to get the latest version of the model in a given stage.
+    # get_latest_versions only returns the newest version per stage, instead
+    # of listing every version like search_model_versions
+    try:
+        in_stage = mlflow_client.get_latest_versions(model_name, stages=[stage])
+    except MlflowException as e:
+        # the model is not registered yet (search_model_versions returned [] here)
+        if e.error_code == "RESOURCE_DOES_NOT_EXIST":
+            return None
+        raise
+    if in_stage:
+        return _get(in_stage[0], "version"), f"models:/{model_name}/{stage}"
+    per_stage = mlflow_client.get_latest_versions(model_name)
+    if not per_stage:
+        return None
+    latest = max(per_stage, key=_version_int)
+    return _get(latest, "version"), f"models:/{model_name}/{_get(latest, 'version')}"
+
+def _latest_version(model_name="RandomForest", stage="Production"):
     """
-    def _get(v, field):
-        # Mlflow may return model version objects or dicts depending on client version
-        if isinstance(v, dict):
-            return v.get(field)
-        return getattr(v, field, None)
+    TTL-cached _query_latest_version. Misses are not cached, so polling for a
+    model that is not registered yet still queries the registry every time.
+    """
+    key = (model_name, stage)
+    now = time.monotonic()
+    with _model_versions_lock:
+        cached = _model_versions_cache.get(key)
+        if cached is not None and now < cached[0]:
+            return cached[1]
+    result = _query_latest_version(model_name, stage)
+    if result is not None:
+        with _model_versions_lock:
+            _model_versions_cache[key] = (now + MODEL_INFO_TTL, result)
+    return result
 
+def get_current_model_info(model_name="RandomForest", stage="Production"):
+    """
+    Query MLflow to get the latest version of the model in a given stage
+    (or the latest version overall when none is in that stage).
+    """
     try:
-        client = MlflowClient()
-        versions = client.search_model_versions("name='{}'".format(model_name))
-        if versions:
-            def _version_int(v):
-                try:
-                    return int(_get(v, "version") or -1)
-                except Exception:
-                    return -1
-
-            sorted_versions = sorted(versions, key=_version_int, reverse=True)
-            return {"name": model_name, "version": _get(sorted_versions[0], "version")}
+        latest = _latest_version(model_name, stage)
+        if latest is not None:
+            return {"name": model_name, "version": latest[0]}
     except Exception as e:
         logger.error("Error querying model", extra={
             "event": "model_query_error",
@@ -72,47 +140,31 @@ def get_current_model_info(model_name="RandomForest", stage="Production"):
         })
     return {"name": model_name, "version": "N/A"}
 
-def wait_for_model_availability(model_name="RandomForest", stage="Production", timeout=600, poll_interval=10):
+def wait_for_model_availability(model_name="RandomForest", stage="Production", timeout=600, poll_interval=10,
+                                initial_interval=0.5, backoff=1.5):
     """
     Wait until the model is available in MLflow in a given stage.
     Uses mlflow.sklearn.load_model to ensure access to predict_proba.
+
+    Polls with exponential backoff: the wait starts at initial_interval and
+    grows by `backoff` after each miss, capped at poll_interval, so a model
+    that becomes ready shortly after startup is picked up within about a second.
+    The registry is always queried at least once; timeout=0 means a single attempt.
     """
-    client = MlflowClient()
-    elapsed = 0
-    def _get(v, field):
-        if isinstance(v, dict):
-            return v.get(field)
-        return getattr(v, field, None)
-
-    while elapsed < timeout:
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+
+    while True:
         try:
             logger.info("Checking model availability", extra={
                 "event": "model_availability_check",
                 "model": model_name,
                 "stage": stage
             })
-            versions = client.search_model_versions("name='{}'".format(model_name))
-            if versions:
-                def _version_int(v):
-                    try:
-                        return int(_get(v, "version") or -1)
-                    except Exception:
-                        return -1
-
-                sorted_versions = sorted(versions, key=_version_int, reverse=True)
-                latest_version = sorted_versions[0]
-                logger.info("Found model versions: %s", [(_version_int(v), _get(v, "current_stage")) for v in sorted_versions])
-
-                # Try Production stage first, then latest version
-                production_versions = [v for v in versions if _get(v, "current_stage") == "Production"]
-                if production_versions:
-                    model_uri = f"models:/{model_name}/Production"
-                    logger.info(f"Using Production stage: {model_uri}")
-                else:
-                    model_uri = f"models:/{model_name}/{_get(latest_version, 'version')}"
-                    logger.info(f"Using latest version: {model_uri}")
-
-                logger.info(f"Attempting to load model from URI: {model_uri}")
+            latest = _latest_version(model_name, stage)
+            if latest is not None:
+                version, model_uri = latest
+                logger.info("Attempting to load model from URI: %s", model_uri)
                 # Prefer mlflow.sklearn loader when available (returns native sklearn estimator).
                 if mlflow_sklearn is not None:
                     loaded_model = mlflow_sklearn.load_model(model_uri)
@@ -120,26 +172,29 @@ def wait_for_model_availability(model_name="RandomForest", stage="Production", t
                     # Fallback to pyfunc which returns a pyfunc wrapper; this may not expose
                     # predict_proba depending on the model flavor, so we try to handle that later.
                     loaded_model = mlflow.pyfunc.load_model(model_uri)
-                logger.info(f"Successfully loaded model from URI: {model_uri}")
+                logger.info("Successfully loaded model from URI: %s", model_uri)
                 logger.info("Model found", extra={
                     "event": "model_found",
                     "model": model_name,
-                    "version": _get(sorted_versions[0], "version")
+                    "version": version
                 })
                 return loaded_model
         except Exception as e:
-            logger.warning("Error checking model", extra={
+            logger.warning("Error checking model", exc_info=True, extra={
                 "event": "model_availability_warning",
                 "error": str(e),
                 "error_type": type(e).__name__
             })
-            logger.error("Traceback: %s", traceback.format_exc())
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        wait = min(interval, remaining)
         logger.info("Waiting before next check", extra={
             "event": "model_availability_wait",
-            "wait_seconds": poll_interval
+            "wait_seconds": wait
         })
-        time.sleep(poll_interval)
-        elapsed += poll_interval
+        time.sleep(wait)
+        interval = min(interval * backoff, poll_interval)
     logger.critical("Timeout waiting for model", extra={
         "event": "model_timeout",
         "model": model_name,
@@ -147,31 +202,124 @@ def wait_for_model_availability(model_name="RandomForest", stage="Production", t
     })
     return None
 
-# Load model on startup - but don't block Flask startup
-model = None
+def _model_input_dtype(loaded_model):
+    """
+    dtype the model consumes internally. sklearn trees compare features against
+    their split thresholds in float32 (predict validates X to float32 before
+    walking the nodes), so tree ensembles get float32 up front and skip a cast
+    on every call. Models loaded through mlflow.pyfunc are unwrapped first so
+    they get the same treatment.
+    """
+    get_raw_model = getattr(loaded_model, "get_raw_model", None)
+    if callable(get_raw_model):
+        try:
+            loaded_model = get_raw_model()
+        except Exception:
+            pass
+    estimators = getattr(loaded_model, "estimators_", None)
+    if estimators is not None and len(estimators) and hasattr(estimators[0], "tree_"):
+        return np.float32
+    return np.float64
+
+def warm_up_model(loaded_model):
+    """
+    Use every core for prediction and run throwaway single-row and batch
+    predictions, so the first real request does not pay the cold-start cost.
+    """
+    if hasattr(loaded_model, "n_jobs"):
+        loaded_model.n_jobs = os.cpu_count()
+    predict_fn = getattr(loaded_model, "predict_proba", None)
+    if not callable(predict_fn):
+        predict_fn = loaded_model.predict
+    n_features = getattr(loaded_model, "n_features_in_", N_FEATURES)
+    dtype = _model_input_dtype(loaded_model)
+    start = time.time()
+    for batch_size in (1, 32):
+        predict_fn(np.zeros((batch_size, n_features), dtype=dtype))
+    logger.info("Model warm-up completed", extra={
+        "event": "model_warmup",
+        "warmup_ms": round((time.time() - start) * 1000, 2)
+    })
+
+# Load model on startup - but don't block Flask startup.
+# Set once a model is serving (readiness for /ready and the gunicorn preload).
+model_ready = threading.Event()
+# (ModelHost, feature dtype) of the model being served, swapped as one unit so a
+# request never pairs a new host with the old dtype (see _model_input_dtype).
+# The ModelHost batches concurrent /predict and /diagnose calls into one model call.
+_model_ref = [None]
 
-def load_model_async():
+def load_model_async(timeout=600):
     """Load model in background thread"""
-    global model
     try:
         logger.info("Starting background model loading")
-        model = wait_for_model_availability(timeout=600, poll_interval=5)
-        if model:
+        loaded = wait_for_model_availability(timeout=timeout, poll_interval=5)
+        if loaded:
+            try:
+                warm_up_model(loaded)
+            except Exception as e:
+                logger.warning("Model warm-up failed", extra={
+                    "event": "model_warmup_error",
+                    "error": str(e)
+                })
+            previous = _model_ref[0]
+            _model_ref[0] = (ModelHost(loaded, logger=logger), _model_input_dtype(loaded))
+            model_ready.set()
+            if previous is not None:
+                previous[0].close()
             logger.info("Model loaded successfully in background")
         else:
             logger.warning("Model not available after background loading")
     except Exception as e:
-        logger.error(f"Error loading model in background: {e}")
+        logger.error("Error loading model in background: %s", e)
 
-# Start model loading in background thread
-import threading
-model_thread = threading.Thread(target=load_model_async, daemon=True)
-model_thread.start()
-logger.info("Webapp started - model loading in background")
+model_thread = None
+
+def start_background_loading():
+    """Start (or restart) model loading in a background thread of this process."""
+    global model_thread
+    model_thread = threading.Thread(target=load_model_async, daemon=True)
+    model_thread.start()
+
+# Registry lookup limits for preload_model: the gunicorn master must not sit in
+# MLflow's HTTP retry/backoff while the registry is unreachable
+PRELOAD_REQUEST_TIMEOUT = os.getenv("PRELOAD_REQUEST_TIMEOUT", "5")
+
+def preload_model():
+    """
+    Try once to load the model in the gunicorn master (see gunicorn.conf.py),
+    so forked workers inherit it copy-on-write instead of each downloading
+    and deserializing it. Requests use a short timeout and no retries; on a
+    miss the workers load in the background (ensure_model_loading).
+    """
+    overrides = {"MLFLOW_HTTP_REQUEST_MAX_RETRIES": "0", "MLFLOW_HTTP_REQUEST_TIMEOUT": PRELOAD_REQUEST_TIMEOUT}
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        logger.info("Preloading model before forking workers")
+        load_model_async(timeout=0)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def ensure_model_loading():
+    """Start background loading in this process unless it already serves a model."""
+    if not model_ready.is_set():
+        start_background_loading()
+
+# Under gunicorn, gunicorn.conf.py drives loading through its server hooks
+# (preload in the master, ensure_model_loading in each worker). Anywhere else
+# (`python app.py`, `flask run`, gunicorn with another config) load here.
+if os.environ.get("MODEL_LOADING_HOOKS") != "1":
+    start_background_loading()
+    logger.info("Webapp started - model loading in background")
 
 @app.route("/model-info")
 def get_model_info():
-    # Query MLflow on each request to reflect the current version.
+    # Cached for MODEL_INFO_TTL seconds; /reload-model invalidates it.
     info = get_current_model_info()
     logger.info("Informacoes do modelo recuperadas", extra={
         "event": "model_info",
@@ -181,26 +329,79 @@ def get_model_info():
     version = info.get("version") if info else "N/A"
     return jsonify({"modelo": info.get("name"), "versao": version})
 
+@app.route("/ready")
+def ready():
+    # Readiness probe: 503 until a model is serving, so cold replicas get no traffic
+    is_ready = model_ready.is_set()
+    return jsonify({"pronto": is_ready}), 200 if is_ready else 503
+
+def _render_index():
+    """Render index.html once; its only dynamic part is url_for('static', ...)."""
+    with app.test_request_context():
+        html = render_template("index.html")
+    return html, hashlib.sha1(html.encode()).hexdigest()
+
+# Pre-rendered at import, so / does no Jinja work per request
+INDEX_HTML, INDEX_ETAG = _render_index()
+
 @app.route("/")
 def home():
-    return render_template("index.html")
+    response = app.response_class(INDEX_HTML, mimetype="text/html")
+    response.set_etag(INDEX_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_MAX_AGE
+    # 304 when the browser already has this version
+    return response.make_conditional(request)
+
+def _json_response(payload, status=200):
+    """Serialize payload with orjson (numpy arrays/scalars included) into a JSON response."""
+    return app.response_class(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                              status=status, mimetype="application/json")
+
+def _request_json():
+    """Parse the request body with orjson; None when it is missing or invalid (like get_json(silent=True))."""
+    try:
+        return orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        return None
+
+def _features_from_json(data, dtype):
+    """
+    Build the (1, n_features) row for /predict from the request JSON.
+
+    "features_b64" (base64 of raw little-endian float32 values) is decoded at
+    memcpy speed; the legacy "features" list is converted with np.fromiter,
+    falling back to np.asarray for nested lists.
+    """
+    if "features_b64" in data:
+        raw = base64.b64decode(data["features_b64"], validate=True)
+        return np.frombuffer(raw, dtype="<f4").astype(dtype, copy=False).reshape(1, -1)
+    if "features" not in data:
+        raise ValueError("O JSON deve incluir o array 'features' ou 'features_b64'.")
+    values = data["features"]
+    try:
+        return np.fromiter(values, dtype=dtype, count=len(values)).reshape(1, -1)
+    except (TypeError, ValueError):
+        return np.ascontiguousarray(values, dtype=dtype).reshape(1, -1)
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    global model
-    if model is None:
+    # one read of the reference: a concurrent /reload-model cannot swap it mid-request
+    serving = _model_ref[0]
+    if serving is None:
         logger.error("Tentativa de previsao sem modelo carregado", extra={
             "event": "prediction_failure",
             "reason": "no_model"
         })
-        return jsonify({"erro": "Modelo não encontrado"}), 500
+        return _json_response({"erro": "Modelo não encontrado"}, 503)
+    host, input_dtype = serving
     try:
-        data = request.get_json(silent=True)
-        if not data or "features" not in data:
-            raise ValueError("O JSON deve incluir o array 'features'.")
+        data = _request_json()
+        if not isinstance(data, dict):
+            raise ValueError("O JSON deve incluir o array 'features' ou 'features_b64'.")
 
-        features = np.array(data["features"]).reshape(1, -1)
-        prediction = model.predict(features)[0]
+        features = _features_from_json(data, input_dtype)
+        _, prediction = host.submit(features).result()
         # Mapear para rótulo legível
         label_map = {0: "Normal", 1: "Pneumonia"}
         label = label_map.get(int(prediction), str(prediction))
@@ -209,25 +410,65 @@ def predict():
             "result": int(prediction),
             "label": label
         })
-        return jsonify({"previsao_codigo": int(prediction), "previsao_label": label})
+        return _json_response({"previsao_codigo": int(prediction), "previsao_label": label})
     except Exception as e:
-        logger.error("Erro durante previsao", extra={
+        logger.error("Erro durante previsao", exc_info=True, extra={
             "event": "prediction_error",
             "error": str(e)
         })
-        logger.error(traceback.format_exc())
-        return jsonify({"erro": str(e)}), 400
+        return _json_response({"erro": str(e)}, 400)
+
+# Per-thread preprocessing buffers for /diagnose; a request thread blocks on its
+# prediction before reusing them, so they are never shared between requests
+_preprocess_tls = threading.local()
+
+def _preprocess_buffers(dtype):
+    """
+    Return this thread's uint8 (IMG_SIZE, IMG_SIZE) resize buffer, the
+    (1, N_FEATURES) feature row of the given dtype, and an (IMG_SIZE, IMG_SIZE)
+    view of that row to cast the resized image into.
+    """
+    if not hasattr(_preprocess_tls, "resize_buf"):
+        _preprocess_tls.resize_buf = np.empty((IMG_SIZE, IMG_SIZE), np.uint8)
+        _preprocess_tls.features = {}
+    features = _preprocess_tls.features
+    if dtype not in features:
+        feat = np.empty((1, N_FEATURES), dtype)
+        features[dtype] = (feat, feat.reshape(IMG_SIZE, IMG_SIZE))
+    return (_preprocess_tls.resize_buf,) + features[dtype]
+
+def _upload_as_array(file):
+    """
+    View an uploaded file as a uint8 array for cv2.imdecode.
+
+    Large uploads that Werkzeug already spooled to a temporary file are
+    memory-mapped (no copy into a Python bytes object); small in-memory
+    uploads are read directly.
+    """
+    stream = file.stream
+    # SpooledTemporaryFile.fileno() would force an in-memory upload to disk,
+    # so look at the underlying file object instead
+    raw = getattr(stream, "_file", stream)
+    try:
+        fd = raw.fileno()
+        if os.fstat(fd).st_size == 0:
+            raise OSError("empty file")
+    except (AttributeError, OSError):
+        return np.frombuffer(stream.read(), np.uint8)
+    return np.frombuffer(mmap.mmap(fd, 0, access=mmap.ACCESS_READ), np.uint8)
 
 @app.route("/diagnose", methods=["POST"])
 def diagnose():
-    global model
-    if model is None:
+    # one read of the reference: a concurrent /reload-model cannot swap it mid-request
+    serving = _model_ref[0]
+    if serving is None:
         logger.error("Tentativa de diagnostico sem modelo carregado", extra={
             "event": "diagnosis_failure",
             "reason": "no_model"
         })
-        return jsonify({"erro": "Modelo não encontrado"}), 500
+        return _json_response({"erro": "Modelo não encontrado"}, 503)
 
+    host, input_dtype = serving
     start_time = time.time()  # Start timing the diagnosis
     try:
         if 'image' not in request.files:
@@ -235,26 +476,32 @@ def diagnose():
                 "event": "diagnosis_error",
                 "reason": "no_image"
             })
-            return jsonify({"erro": "Nenhuma imagem enviada."}), 400
+            return _json_response({"erro": "Nenhuma imagem enviada."}, 400)
         
         file = request.files['image']
-        image_bytes = file.read()
-        np_array = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(np_array, cv2.IMREAD_GRAYSCALE)
+        np_array = _upload_as_array(file)
+        # Decode already downscaled 1/8 (DCT scaling for JPEG); only images too
+        # small to still cover IMG_SIZE x IMG_SIZE afterwards are decoded at full size.
+        # The S3 training loader (bucket_utils._decode_bytes) applies the same rule;
+        # the local-directory loader uses PIL draft(), which may pick 1/2 or 1/4
+        # instead of full size for images between 1x and 8x IMG_SIZE.
+        img = cv2.imdecode(np_array, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if img is not None and min(img.shape[:2]) < IMG_SIZE:
+            img = cv2.imdecode(np_array, cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise ValueError("Não foi possível decodificar a imagem.")
 
-        # Processar imagem para diagnostico
-        img_resized = cv2.resize(img, (64, 64))
-        features = img_resized.flatten().reshape(1, -1)
+        # Processar imagem para diagnostico: resize em uint8 (mesmo arredondamento
+        # do treino) e um único cast para a linha de features (buffers por thread)
+        resize_buf, features, features_2d = _preprocess_buffers(input_dtype)
+        cv2.resize(img, (IMG_SIZE, IMG_SIZE), dst=resize_buf)
+        np.copyto(features_2d, resize_buf)
         pneumonia_prob = None
         diagnosis_str = ""
 
         # Prefer predict_proba when available; otherwise fall back to predict
-        predict_proba_fn = getattr(model, "predict_proba", None)
-        if callable(predict_proba_fn):
-            probs = predict_proba_fn(features)
-            probabilities = np.asarray(probs)[0]
+        probabilities, pred = host.submit(features).result()
+        if probabilities is not None:
             if len(probabilities) > 1:
                 pneumonia_prob = float(probabilities[1])
                 diagnosis_str = f"Probabilidade de Pneumonia: {pneumonia_prob*100:.2f}%"
@@ -262,27 +509,26 @@ def diagnose():
                 diagnosis_str = f"Probabilidades previstas: {probabilities.tolist()}"
         else:
             # Models loaded via mlflow.pyfunc may not expose predict_proba; use predict as fallback
-            pred = model.predict(features)[0]
             label_map = {0: "Normal", 1: "Pneumonia"}
             label = label_map.get(int(pred), str(pred))
             diagnosis_str = f"Classe prevista: {label} ({int(pred)})"
         
         inference_time = time.time() - start_time  # Calculate inference time
         
-        # Log diagnosis details with structured keys.
-        logger.info("Diagnostico realizado com sucesso", extra={
-            "event": "diagnosis",
-            "diagnosis": diagnosis_str,
-            "inference_time_ms": float(f"{inference_time*1000:.2f}")
-        })
-        return jsonify({"diagnostico": diagnosis_str, "tempo_inferencia_seg": inference_time})
+        # Log diagnosis details with structured keys (extra is only built when INFO is enabled).
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Diagnostico realizado com sucesso", extra={
+                "event": "diagnosis",
+                "diagnosis": diagnosis_str,
+                "inference_time_ms": round(inference_time * 1000, 2)
+            })
+        return _json_response({"diagnostico": diagnosis_str, "tempo_inferencia_seg": inference_time})
     except Exception as e:
-        logger.error("Erro durante diagnostico", extra={
+        logger.error("Erro durante diagnostico", exc_info=True, extra={
             "event": "diagnosis_error",
             "error": str(e)
         })
-        logger.error(traceback.format_exc())
-        return jsonify({"erro": str(e)}), 400
+        return _json_response({"erro": str(e)}, 400)
 
 @app.route("/feedback", methods=["POST"])
 def feedback():
@@ -304,16 +550,18 @@ def feedback():
 
 @app.route("/reload-model", methods=["POST"])
 def reload_model():
-    global model
-    global model_thread
     try:
         logger.info("Recarregando modelo do MLflow", extra={
             "event": "model_reload_start"
         })
-        model = None  # Resetar modelo
+        # Resetar modelo: requisições recebem 503 até o novo modelo carregar
+        model_ready.clear()
+        previous, _model_ref[0] = _model_ref[0], None
+        if previous is not None:
+            previous[0].close()
+        invalidate_model_info_cache()
         # Start new background loading
-        model_thread = threading.Thread(target=load_model_async, daemon=True)
-        model_thread.start()
+        start_background_loading()
         logger.info("Recarregamento do modelo iniciado em background", extra={
             "event": "model_reload_started"
         })
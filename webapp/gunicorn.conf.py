@@ -0,0 +1,31 @@
+import os
+
+# Loaded automatically by `gunicorn app:app` from the working directory.
+bind = "0.0.0.0:5001"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# Threaded workers: concurrent requests in one worker share its ModelHost queue
+# and get batched into one model call (see utils/batching.py)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Import the app once in the master so a preloaded model is shared copy-on-write
+preload_app = os.getenv("PRELOAD_MODEL", "1") == "1"
+
+# Read by the app/workers (they inherit the master's environment):
+# REQUEST_THREADS by utils.batching, MODEL_LOADING_HOOKS by app.py, which then
+# leaves model loading to the hooks below instead of starting it at import
+os.environ["REQUEST_THREADS"] = str(threads)
+os.environ["MODEL_LOADING_HOOKS"] = "1"
+
+
+def when_ready(server):
+    # Runs in the master after the port is bound and before workers are forked
+    if server.cfg.preload_app:
+        import app
+        app.preload_model()
+
+
+def post_worker_init(worker):
+    # Runs in each worker once the app is imported: load in the background
+    # unless the model was inherited from the master
+    import app
+    app.ensure_model_loading()
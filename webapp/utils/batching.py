@@ -0,0 +1,155 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Threads serving requests in each process (exported by gunicorn.conf.py). With
+# a single one (sync workers, plain `python app.py`) there is never a second
+# request to batch with, so predictions run inline on the request thread.
+REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", "1"))
+# Maximum number of requests coalesced into one model call; 1 disables batching
+MAX_BATCH = int(os.getenv("MAX_BATCH", "32" if REQUEST_THREADS > 1 else "1"))
+# How long the first request is held to accumulate followers. RandomForest has
+# a high fixed cost per call but vectorizes well across rows, so a few ms of
+# delay under bursty load buys much larger batches. Without request
+# concurrency no follower can arrive, so the wait defaults to 0 there.
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "2" if REQUEST_THREADS > 1 else "0"))
+
+_STOP = object()
+
+
+class ModelHost:
+    """
+    Coalesces concurrent single-row predictions into batched model calls.
+
+    Request threads call submit() and block on the returned Future; a single
+    consumer thread stacks the queued rows, runs one predict_proba (or
+    predict, for models that do not expose it) on the whole batch and hands
+    each request its own row of the result.
+
+    Prediction stays in this process on purpose: request threads only wait on
+    their Future (which releases the GIL), and sklearn forests already run the
+    trees on threads (require="sharedmem") inside C code that releases the GIL.
+    A process pool would hold another copy of the model per gunicorn worker and
+    pickle every batch across the process boundary.
+
+    With max_batch <= 1 there is no consumer thread: submit() predicts inline
+    and returns an already-resolved Future.
+    """
+
+    def __init__(self, model, max_batch: int = MAX_BATCH, batch_wait_ms: float = BATCH_WAIT_MS, logger=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = batch_wait_ms / 1000.0
+        self.logger = logger or logging.getLogger(__name__)
+        self.inline = max_batch <= 1
+        self._lock = threading.Lock()
+        self._closed = False
+        if not self.inline:
+            self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _ensure_running(self):
+        # Threads do not survive fork: a host created in the gunicorn master
+        # (--preload) gets a fresh queue and consumer in each worker
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    def submit(self, features) -> Future:
+        """
+        Queue one (1, n_features) row for prediction.
+
+        The Future resolves to (probabilities, prediction), where probabilities
+        is None when the model has no predict_proba.
+        """
+        n_features = getattr(self.model, "n_features_in_", None)
+        if n_features is not None and features.shape[-1] != n_features:
+            raise ValueError(f"Esperado {n_features} features, recebido {features.shape[-1]}.")
+        future = Future()
+        if not self.inline:
+            self._ensure_running()
+            with self._lock:
+                if not self._closed:
+                    self._queue.put((features, future))
+                    return future
+        # inline mode, or a request that picked up this host just before it was
+        # replaced (served here rather than queued behind the stop marker)
+        try:
+            future.set_result(self._predict(features)[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        """Stop the consumer thread once the queued requests are served."""
+        with self._lock:
+            self._closed = True
+            if not self.inline:
+                self._queue.put(_STOP)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # once the window has closed, still drain whatever is already queued
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            # realized batch size, so BATCH_WAIT_MS / MAX_BATCH can be tuned
+            self.logger.info("Batch dispatched", extra={"event": "batch", "size": len(batch)})
+            try:
+                rows = np.vstack([features for features, _ in batch])
+                results = self._predict(rows)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # One malformed row (e.g. wrong width on a model without
+                    # n_features_in_) must not fail the requests batched with it:
+                    # retry row by row so only the offending request gets the error
+                    self._predict_each(batch)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _predict_each(self, batch):
+        for features, future in batch:
+            try:
+                future.set_result(self._predict(features)[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def _predict(self, rows):
+        predict_proba_fn = getattr(self.model, "predict_proba", None)
+        if not callable(predict_proba_fn):
+            return [(None, pred) for pred in self.model.predict(rows)]
+        probs = np.asarray(predict_proba_fn(rows))
+        classes = getattr(self.model, "classes_", None)
+        best = probs.argmax(axis=1)
+        preds = classes[best] if classes is not None else best
+        return list(zip(probs, preds))
@@ -1,5 +1,19 @@
 from fluent.handler import FluentRecordFormatter, FluentHandler
+from fluent.sender import EventTime
+import atexit
 import logging
+import logging.handlers
+import msgpack
+import os
+import queue
+import threading
+import traceback
+
+# Records buffered between request threads and the Fluentd sender thread
+LOG_QUEUE_SIZE = 10000
+# Records sent to Fluentd per message, and the longest a record waits for its batch
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "512"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "100")) / 1000.0
 
 class ExtraFieldsFluentFormatter(FluentRecordFormatter):
     """
@@ -23,6 +37,135 @@ class ExtraFieldsFluentFormatter(FluentRecordFormatter):
         
         return data
 
+class BatchingFluentHandler(FluentHandler):
+    """
+    FluentHandler that sends records in batches using Fluentd's Forward mode
+    ([tag, [[time, record], ...]]): one msgpack message and one socket write per
+    batch instead of one per record. A batch is sent once `batch_size` records
+    are buffered or every `flush_interval` seconds, whichever comes first.
+    """
+    def __init__(self, tag, host='localhost', port=24224, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, **kwargs):
+        super().__init__(tag, host=host, port=port, **kwargs)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._start_flusher()
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _start_flusher(self):
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # never let a bad batch stop periodic flushing
+                traceback.print_exc()
+
+    def _reset_after_fork(self):
+        """
+        Give a forked worker (gunicorn --preload) its own connection and flusher.
+
+        The inherited sender shares the parent's TCP connection, and its lock
+        may have been held at fork time, so its socket fd is closed in this
+        process only (no shutdown, the parent keeps the connection) and a new
+        sender is created on the next flush. Buffered records are the parent's
+        to send, and the flusher thread did not survive the fork.
+        """
+        inherited = self._sender
+        self._sender = None
+        sock = getattr(inherited, "socket", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._buffer = []
+        self._start_flusher()
+
+    def emit(self, record):
+        sender = self.sender
+        timestamp = EventTime(record.created) if sender.nanosecond_precision else int(record.created)
+        # emit runs under self.lock (Handler.handle), which also guards flush()
+        self._buffer.append((timestamp, self.format(record)))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        sender = self.sender
+        entries = [self._pack_entry(sender, timestamp, data) for timestamp, data in batch]
+        packer = msgpack.Packer(**sender.msgpack_kwargs)
+        # [tag, [entry, ...]] with each entry packed on its own (see _pack_entry)
+        packet = b"".join([
+            packer.pack_array_header(2), packer.pack(sender.tag),
+            packer.pack_array_header(len(entries)), *entries,
+        ])
+        sender._send(packet)
+
+    @staticmethod
+    def _pack_entry(sender, timestamp, data):
+        """
+        Pack one [time, record] entry. A record that msgpack cannot serialize
+        (e.g. an object or np.int64 in `extra`) is replaced by an error record,
+        as FluentSender.emit_with_time does, instead of failing the whole batch.
+        """
+        try:
+            return msgpack.packb([timestamp, data], **sender.msgpack_kwargs)
+        except Exception:
+            return msgpack.packb([timestamp, {
+                "level": "CRITICAL",
+                "message": "Can't output to log",
+                "traceback": traceback.format_exc(),
+            }], **sender.msgpack_kwargs)
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+        super().close()
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of
+    blocking (or reporting an error) on the request thread.
+    """
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def _attach_async(logger, handler, maxsize=LOG_QUEUE_SIZE):
+    """
+    Route the logger through a bounded in-process queue; a QueueListener
+    thread drains it into `handler`, so the network send to Fluentd never
+    runs on the thread that logged.
+    """
+    log_queue = queue.Queue(maxsize=maxsize)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    def _restart_in_child():
+        # The listener thread does not survive fork (e.g. gunicorn --preload):
+        # give each worker its own queue and listener thread
+        new_queue = queue.Queue(maxsize=maxsize)
+        queue_handler.queue = new_queue
+        listener.queue = new_queue
+        listener._thread = None
+        listener.start()
+
+    os.register_at_fork(after_in_child=_restart_in_child)
+    logger.addHandler(queue_handler)
+
 def configure_fluent_logging(logger_name: str, service_name: str, fluent_host: str, fluent_port: int):
     """
     Configure fluent logging with our custom formatter
@@ -39,11 +182,11 @@ def configure_fluent_logging(logger_name: str, service_name: str, fluent_host: s
     }
     
     # Create and configure handler (fixed variable name)
-    handler = FluentHandler('app', host=fluent_host, port=fluent_port)
+    handler = BatchingFluentHandler('app', host=fluent_host, port=fluent_port)
     formatter = ExtraFieldsFluentFormatter(base_format)
     handler.setFormatter(formatter)
     
-    # Add handler to logger
-    logger.addHandler(handler)
+    # Add handler to logger (asynchronously, see _attach_async)
+    _attach_async(logger, handler)
     
     return logger
\ No newline at end of file